@@ -1,6 +1,5 @@
 import argparse
 import pickle
-import random
 from typing import Any
 
 from pyppl import ast
@@ -11,7 +10,7 @@ from pyppl.parser import parse
 
 def init_params(expr: ast.ExpressionNode) -> ParamVector:
     """Initialize parameters to random values."""
-    return ParamVector({k: random.random()} for k in expr.params)
+    return ParamVector.random(expr.params)
 
 
 def param_val(param: str) -> tuple[str, float]:
@@ -91,7 +90,9 @@ class PickleDumper:
     def __enter__(self):
         # The 'open' function will be mocked by pytest
         self.pickle_file = open(self.path, mode="wb")
-        self.pickler = pickle.Pickler(self.pickle_file)
+        self.pickler = pickle.Pickler(
+            self.pickle_file, protocol=pickle.HIGHEST_PROTOCOL
+        )
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -111,6 +112,13 @@ def main():
     generate_parser.add_argument(
         "--n-samples", "-n", type=int, default=10, help="number of samples to generate"
     )
+    generate_parser.add_argument(
+        "--workers",
+        "-j",
+        type=int,
+        default=1,
+        help="number of processes to sample with",
+    )
     generate_parser.add_argument(
         "--param",
         "-p",
@@ -133,7 +141,9 @@ def main():
                 env = ast.Environment(args.params)
             else:
                 env = None
-            samples = prog_ast.sample_toplevel(env=env, k=args.n_samples)
+            samples = prog_ast.sample_toplevel(
+                env=env, k=args.n_samples, workers=args.workers
+            )
         with PickleDumper(args.data) as dumper:
             dumper.dump(samples)
 
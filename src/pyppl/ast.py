@@ -1,13 +1,37 @@
 import abc
+import concurrent.futures
 import contextlib
+import functools
+import itertools
 import random
-from dataclasses import dataclass, field
+import sys
+from dataclasses import dataclass, field, fields
 from functools import cached_property
-from typing import Any, Dict, List, Optional
+from typing import (
+    TYPE_CHECKING,
+    AbstractSet,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+)
 
 from pyppl.params import ParamVector
 
 
+# Marks a name that had no visible binding before being bound in a scope
+_UNBOUND = object()
+
+# Number of binding tags an environment keeps before dropping unused ones
+_MIN_TAG_LIMIT = 64
+
+# Source of binding tags, shared so that creating an environment doesn't
+# seed a generator
+_TAG_RNG = random.Random()
+
+
 @dataclass
 class Environment:
     """Naming environment for expression evaluation"""
@@ -19,6 +43,7 @@ class Environment:
         self,
         params: Optional[Dict[str, float]] = None,
         initial_vals: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None,
     ):
         """Initializes an environment"""
         if params is not None:
@@ -28,6 +53,31 @@ class Environment:
         if initial_vals is None:
             initial_vals = {}
         self.scopes = [initial_vals]
+        # Flattened view of the visible bindings, so that lookups don't walk
+        # the scope stack. Each scope has an undo log of the values its
+        # bindings shadowed, which is replayed when the scope is removed.
+        self.bindings: Dict[str, Any] = dict(initial_vals)
+        self._undo: List[List[tuple[str, Any]]] = [
+            [(name, _UNBOUND) for name in initial_vals]
+        ]
+        # The fingerprint identifies the visible bindings: it is the XOR of a
+        # random 64-bit tag per (name, value) pair, so it can be updated in
+        # O(1) as bindings are shadowed and restored, and equal binding
+        # states get equal fingerprints regardless of how they were reached.
+        self._tags: Dict[tuple[str, int], tuple[int, Any]] = {}
+        self._tag_limit = _MIN_TAG_LIMIT
+        self.fingerprint = 0
+        for name, val in initial_vals.items():
+            self.fingerprint ^= self._tag(name, val)
+        # Fingerprint to restore when each scope is removed; removing the
+        # initial scope leaves no bindings
+        self._scope_fingerprints = [0]
+        self.infer_cache: Optional[Dict[tuple, Any]] = None
+        # Source of randomness for sampling. Defaults to the random module
+        # itself, i.e. its shared global generator.
+        self.rng: Any = random if rng is None else rng
+        self._scope_ctx = _TempScope(self)
+        self._binding_ctx = _TempBinding(self)
 
     @cached_property
     def param_names(self) -> set[str]:
@@ -37,14 +87,29 @@ class Environment:
     def clear_bindings(self) -> None:
         """Clear all bindings in the environment"""
         self.scopes = [{}]
+        self.bindings = {}
+        self._undo = [[]]
+        self.fingerprint = 0
+        self._scope_fingerprints = [0]
+        self._tags = {}
+        self._tag_limit = _MIN_TAG_LIMIT
 
     def add_scope(self):
         """Add a scope to the stack"""
         self.scopes.append({})
+        self._undo.append([])
+        self._scope_fingerprints.append(self.fingerprint)
 
     def remove_scope(self):
         """Remove a scope from the stack"""
         self.scopes.pop()
+        bindings = self.bindings
+        for name, prev in reversed(self._undo.pop()):
+            if prev is _UNBOUND:
+                del bindings[name]
+            else:
+                bindings[name] = prev
+        self.fingerprint = self._scope_fingerprints.pop()
 
     def add_binding(self, name: str, val: Any):
         """Add a binding to the local scope
@@ -56,6 +121,40 @@ class Environment:
         if name in local_scope:
             raise ValueError(f"name {name} already bound in local scope")
         local_scope[name] = val
+        prev = self.bindings.get(name, _UNBOUND)
+        self._undo[-1].append((name, prev))
+        self.bindings[name] = val
+        fingerprint = self.fingerprint ^ self._tag(name, val)
+        if prev is not _UNBOUND:
+            fingerprint ^= self._tag(name, prev)
+        self.fingerprint = fingerprint
+
+    def _tag(self, name: str, val: Any) -> int:
+        """Get the fingerprint tag of a binding"""
+        key = (name, id(val))
+        entry = self._tags.get(key)
+        if entry is None:
+            if len(self._tags) >= self._tag_limit:
+                self._prune_tags()
+            # Hold a reference to val so that its id is not reused
+            entry = self._tags[key] = (_TAG_RNG.getrandbits(64), val)
+        return entry[0]
+
+    def _prune_tags(self) -> None:
+        """Forget the tags of values that are no longer bound
+
+        Only tags of visible or shadowed bindings contribute to the current
+        and saved fingerprints, so the rest can be dropped; a value that is
+        bound again later just gets a fresh tag. The limit grows with the
+        number of live tags, so pruning is amortized O(1) per binding.
+        """
+        live = {(name, id(val)) for name, val in self.bindings.items()}
+        for undo in self._undo:
+            for name, prev in undo:
+                if prev is not _UNBOUND:
+                    live.add((name, id(prev)))
+        self._tags = {key: entry for key, entry in self._tags.items() if key in live}
+        self._tag_limit = max(_MIN_TAG_LIMIT, 2 * len(self._tags))
 
     def get_binding(self, name: str):
         """Look up a binding.
@@ -63,10 +162,10 @@ class Environment:
         Args:
             name: name to look up binding for
         """
-        for scope in reversed(self.scopes):
-            if name in scope:
-                return scope[name]
-        raise ValueError(f"name {name} not bound")
+        try:
+            return self.bindings[name]
+        except KeyError:
+            raise ValueError(f"name {name} not bound") from None
 
     def get_param(self, name: str) -> float:
         """Look up a parameter.
@@ -80,21 +179,184 @@ class Environment:
         return self.params[name]
 
     @contextlib.contextmanager
-    def temp_scope(self):
+    def memoize(self):
+        """Memoize inference results computed within the block.
+
+        Results are keyed on the node, the binding fingerprint and the queried
+        value. The cache is discarded when the outermost block exits, since
+        node ids are only stable while the program is alive.
+        """
+        if self.infer_cache is not None:
+            yield self
+            return
+        self.infer_cache = {}
         try:
-            self.add_scope()
             yield self
         finally:
-            self.remove_scope()
+            self.infer_cache = None
+
+    def temp_scope(self) -> "_TempScope":
+        return self._scope_ctx
+
+    def temp_binding(self, name: str, val) -> "_TempBinding":
+        ctx = self._binding_ctx
+        ctx.pending = (name, val)
+        return ctx
+
+
+class _TempScope:
+    """Context manager adding a scope for the duration of a block.
+
+    Environments keep a single instance and hand it out from temp_scope(),
+    since entering and exiting need no per-block state.
+    """
+
+    __slots__ = ("env",)
+
+    def __init__(self, env: Environment):
+        self.env = env
+
+    def __enter__(self) -> Environment:
+        self.env.add_scope()
+        return self.env
+
+    def __exit__(self, *exc_info) -> None:
+        self.env.remove_scope()
+
+
+class _TempBinding(_TempScope):
+    """Context manager adding a scope holding a single binding.
+
+    The binding is staged by temp_binding() and consumed on entry, so nested
+    blocks can share the instance.
+    """
+
+    __slots__ = ("pending",)
+
+    # The (name, value) binding to add on the next entry
+    pending: tuple[str, Any]
+
+    def __enter__(self) -> Environment:
+        env = self.env
+        env.add_scope()
+        try:
+            env.add_binding(*self.pending)
+        except BaseException:
+            env.remove_scope()
+            raise
+        return env
+
+
+def _memoize_infer(method):
+    """Memoize an inference method in the environment's inference cache
+
+    Results are keyed on the method, the node, the binding fingerprint and
+    any further arguments. Outside a memoize() block the method is called
+    directly.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, env: Environment, *args):
+        cache = env.infer_cache
+        if cache is None:
+            return method(self, env, *args)
+        key = (method, id(self), env.fingerprint, *args)
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        # Computed outside the handler, so that errors raised during
+        # inference are not chained to the cache miss
+        result = cache[key] = method(self, env, *args)
+        return result
+
+    return wrapper
+
+
+class SamplerCompileError(Exception):
+    """Thrown when a program cannot be compiled into a sampling kernel."""
+
+
+class _SamplerCodegen:
+    """Accumulates the Python source of a compiled sampling kernel.
+
+    Each node appends straight-line statements for one sample to the loop
+    body and returns a local or global name holding its result. Compound
+    values are assigned to fresh locals rather than nested, so the generated
+    expressions stay flat however deep the program is. Objects referenced by
+    the generated code are passed in through its global namespace.
+    """
+
+    def __init__(self):
+        self.prelude: List[str] = []
+        self.body: List[str] = []
+        self.indent = ""
+        self.namespace: Dict[str, Any] = {"make_cons": ConsNode._unchecked}
+        self.param_locals: Dict[str, str] = {}
+        self.counter = itertools.count()
+
+    def fresh(self, prefix: str = "v") -> str:
+        """Get a fresh local variable name"""
+        return f"{prefix}{next(self.counter)}"
+
+    def line(self, stmt: str) -> None:
+        """Append a statement to the loop body at the current indentation"""
+        self.body.append(self.indent + stmt)
 
     @contextlib.contextmanager
-    def temp_binding(self, name: str, val):
+    def indented(self):
+        """Indent the statements appended within the block"""
+        outer = self.indent
+        self.indent = outer + "    "
         try:
-            self.add_scope()
-            self.add_binding(name, val)
-            yield self
+            yield
         finally:
-            self.remove_scope()
+            self.indent = outer
+
+    def const(self, obj: Any) -> str:
+        """Get a global name referring to an object"""
+        name = self.fresh("c")
+        self.namespace[name] = obj
+        return name
+
+    def param(self, name: str) -> str:
+        """Get a local holding a parameter value, looked up once per call"""
+        if name not in self.param_locals:
+            local = self.fresh("p")
+            self.prelude.append(f"{local} = env.get_param({name!r})")
+            self.param_locals[name] = local
+        return self.param_locals[name]
+
+    def build(self, result: str) -> Callable:
+        """Compile the kernel function
+
+        Raises:
+            SyntaxError: if the generated source exceeds the compiler's limits
+        """
+        src = "\n".join(
+            [
+                "def kernel(env, k, rand):",
+                *(f"    {line}" for line in self.prelude),
+                # Hash-cons list cells so that each distinct value is built
+                # once per call; the cells keep their children alive, so
+                # child ids are unique while the table exists.
+                "    conses = {}",
+                "    def cons(head, tail):",
+                "        key = (id(head), id(tail))",
+                "        node = conses.get(key)",
+                "        if node is None:",
+                "            node = conses[key] = make_cons(head, tail)",
+                "        return node",
+                "    samples = []",
+                "    append = samples.append",
+                "    for _ in range(k):",
+                *(f"        {line}" for line in self.body),
+                f"        append({result})",
+                "    return samples",
+            ]
+        )
+        exec(compile(src, "<pyppl sampler>", "exec"), self.namespace)
+        return self.namespace["kernel"]
 
 
 # --- Base AST Node Classes ---
@@ -105,8 +367,23 @@ class ASTNode(abc.ABC):
     """
     Abstract base class for all Abstract Syntax Tree nodes.
     Provides a common interface for AST elements.
+
+    Nodes declare __slots__ so instances carry no __dict__. Since frozen
+    dataclasses reject setattr, pickling goes through the field values.
     """
 
+    __slots__ = ()
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, f.name) for f in fields(self))
+
+    def __setstate__(self, state: tuple) -> None:
+        for f, val in zip(fields(self), state):
+            object.__setattr__(self, f.name, val)
+        post_init = getattr(self, "__post_init__", None)
+        if post_init is not None:
+            post_init()  # Rebuild any derived slots
+
     @abc.abstractmethod
     def infer(self, env: Environment, val: "PureNode") -> float:
         """Infer the probability of a value for this program"""
@@ -121,6 +398,8 @@ class PureNode(ASTNode):
     Abstract base class for expression (p) nodes.
     """
 
+    __slots__ = ()
+
     def eval(self, env: Environment) -> "PureNode":
         """Evaluate this pure expression"""
         return self
@@ -131,6 +410,30 @@ class PureNode(ASTNode):
     def infer(self, env: Environment, val: "PureNode") -> float:
         return float(self.eval(env) == val.eval(env))
 
+    @property
+    def free_vars(self) -> frozenset[str]:
+        """Names of the variables this expression depends on"""
+        return frozenset()
+
+    def fold_constants(self) -> "PureNode":
+        """Simplify conditionals whose condition is a literal boolean"""
+        return self
+
+    def emit(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        """Generate a Python expression evaluating this node
+
+        Args:
+            gen: code generator for the enclosing sampling kernel
+            scope: mapping of bound variable names to kernel locals
+
+        Returns:
+            source of the expression
+
+        Raises:
+            SamplerCompileError: if the node cannot be compiled
+        """
+        raise SamplerCompileError(f"cannot compile {type(self).__name__}")
+
 
 def var(name: str) -> "PureNode":
     """Construct a variable node"""
@@ -139,9 +442,7 @@ def var(name: str) -> "PureNode":
 
 def boolean(val: bool) -> "PureNode":
     """Construct a true or false node"""
-    if val:
-        return TrueNode()
-    return FalseNode()
+    return _TRUE if val else _FALSE
 
 
 @dataclass(frozen=True)
@@ -151,6 +452,8 @@ class VariableNode(PureNode):
     Grammar: x
     """
 
+    __slots__ = ("name",)
+
     name: str
 
     def __post_init__(self):
@@ -160,34 +463,82 @@ class VariableNode(PureNode):
         Args:
             name: The name of the variable (e.g., 'a', 'b').
         """
-        if not isinstance(self.name, str) or not self.name:
-            raise ValueError("Variable name must be a non-empty string.")
+        if __debug__:
+            if not isinstance(self.name, str) or not self.name:
+                raise ValueError("Variable name must be a non-empty string.")
+        # Interned names make binding lookups hit on identity
+        object.__setattr__(self, "name", sys.intern(self.name))
 
     def eval(self, env: Environment) -> PureNode:
         return env.get_binding(self.name)
 
+    @property
+    def free_vars(self) -> frozenset[str]:
+        return frozenset((self.name,))
 
-@dataclass(frozen=True)
-class TrueNode(PureNode):
+    def emit(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        if self.name in scope:
+            return scope[self.name]
+        return f"env.get_binding({self.name!r})"
+
+
+class _Interned:
+    """Mixin for fieldless nodes: every construction returns one shared instance"""
+
+    __slots__ = ()
+
+    def __new__(cls):
+        instance = cls.__dict__.get("_instance")
+        if instance is None:
+            instance = super().__new__(cls)
+            cls._instance = instance  # type: ignore[attr-defined]
+        return instance
+
+    # Instances are unique, so equality is identity. Dataclass equality would
+    # also hash every fieldless node alike, making lists that differ only in
+    # their elements collide in sets and dicts.
+    __eq__ = object.__eq__
+
+    def __hash__(self) -> int:
+        return hash(type(self).__name__)
+
+    def __reduce__(self):
+        # Unpickle through the constructor so that the shared instance is
+        # returned; protocols 0 and 1 would otherwise bypass __new__
+        return (type(self), ())
+
+
+@dataclass(frozen=True, eq=False)
+class TrueNode(_Interned, PureNode):
     """
     Represents the boolean literal 'tt' (true) in a expression.
     Grammar: tt
     """
 
+    __slots__ = ()
+
     def __bool__(self) -> bool:
         return True
 
+    def emit(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        return gen.const(self)
 
-@dataclass(frozen=True)
-class FalseNode(PureNode):
+
+@dataclass(frozen=True, eq=False)
+class FalseNode(_Interned, PureNode):
     """
     Represents the boolean literal 'ff' (false) in a expression.
     Grammar: ff
     """
 
+    __slots__ = ()
+
     def __bool__(self) -> bool:
         return False
 
+    def emit(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        return gen.const(self)
+
 
 @dataclass(frozen=True)
 class IfElseNode(PureNode):
@@ -196,10 +547,15 @@ class IfElseNode(PureNode):
     Grammar: if p then p else p
     """
 
+    __slots__ = ("condition", "true_branch", "false_branch", "_branches")
+
     condition: PureNode
     true_branch: PureNode
     false_branch: PureNode
 
+    if TYPE_CHECKING:
+        _branches: tuple[PureNode, PureNode] = field(init=False)
+
     def __post_init__(self):
         """
         Initializes an IfElseNode.
@@ -209,18 +565,57 @@ class IfElseNode(PureNode):
             true_branch: The expression to execute if condition is true (an instance of PureNode).
             false_branch: The expression to execute if condition is false (an instance of PureNode).
         """
-        if not isinstance(self.condition, PureNode):
-            raise TypeError("Condition must be an instance of PureNode.")
-        if not isinstance(self.true_branch, PureNode):
-            raise TypeError("True branch must be an instance of PureNode.")
-        if not isinstance(self.false_branch, PureNode):
-            raise TypeError("False branch must be an instance of PureNode.")
+        if __debug__:
+            if not isinstance(self.condition, PureNode):
+                raise TypeError("Condition must be an instance of PureNode.")
+            if not isinstance(self.true_branch, PureNode):
+                raise TypeError("True branch must be an instance of PureNode.")
+            if not isinstance(self.false_branch, PureNode):
+                raise TypeError("False branch must be an instance of PureNode.")
+        # Indexed by the truth value of the condition
+        object.__setattr__(self, "_branches", (self.false_branch, self.true_branch))
 
     def eval(self, env: Environment) -> PureNode:
         cond_val = self.condition.eval(env)
-        if bool(cond_val):  # Use bool() explicitly as PureNode has a custom __bool__
-            return self.true_branch.eval(env)
-        return self.false_branch.eval(env)
+        # Booleans are interned, so an identity check settles the common case;
+        # anything else goes through PureNode's custom __bool__.
+        truth = cond_val is _TRUE or (cond_val is not _FALSE and bool(cond_val))
+        return self._branches[truth].eval(env)
+
+    @property
+    def free_vars(self) -> frozenset[str]:
+        return (
+            self.condition.free_vars
+            | self.true_branch.free_vars
+            | self.false_branch.free_vars
+        )
+
+    def emit(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        # Only the chosen branch is evaluated, as in eval()
+        result = gen.fresh()
+        gen.line(f"if {self.condition.emit(gen, scope)}:")
+        with gen.indented():
+            gen.line(f"{result} = {self.true_branch.emit(gen, scope)}")
+        gen.line("else:")
+        with gen.indented():
+            gen.line(f"{result} = {self.false_branch.emit(gen, scope)}")
+        return result
+
+    def fold_constants(self) -> PureNode:
+        cond = self.condition.fold_constants()
+        if cond is _TRUE:
+            return self.true_branch.fold_constants()
+        if cond is _FALSE:
+            return self.false_branch.fold_constants()
+        true_branch = self.true_branch.fold_constants()
+        false_branch = self.false_branch.fold_constants()
+        if (
+            cond is self.condition
+            and true_branch is self.true_branch
+            and false_branch is self.false_branch
+        ):
+            return self
+        return IfElseNode(cond, true_branch, false_branch)
 
 
 @dataclass(frozen=True)
@@ -230,9 +625,15 @@ class ConsNode(PureNode):
     Grammar: cons p p
     """
 
+    __slots__ = ("head", "tail", "_is_ground", "_hash")
+
     head: PureNode
     tail: PureNode
 
+    if TYPE_CHECKING:
+        _is_ground: bool = field(init=False)
+        _hash: int = field(init=False)
+
     def __post_init__(self):
         """
         Initializes a ConsNode.
@@ -241,26 +642,112 @@ class ConsNode(PureNode):
             head: The first expression (an instance of PureNode).
             tail: The second expression (an instance of PureNode).
         """
-        # Type validation moved to __post_init__
-        if not isinstance(self.head, PureNode):
-            raise TypeError("Head must be an instance of PureNode.")
-        if not isinstance(self.tail, PureNode):
-            raise TypeError("Tail must be an instance of PureNode.")
+        if __debug__:
+            if not isinstance(self.head, PureNode):
+                raise TypeError("Head must be an instance of PureNode.")
+            if not isinstance(self.tail, PureNode):
+                raise TypeError("Tail must be an instance of PureNode.")
+        self._init_derived()
+
+    @classmethod
+    def _unchecked(cls, head: PureNode, tail: PureNode) -> "ConsNode":
+        """Construct a cell without running the dataclass initializer
+
+        Used for cells built from evaluated values, whose types are known.
+        """
+        node = object.__new__(cls)
+        object.__setattr__(node, "head", head)
+        object.__setattr__(node, "tail", tail)
+        node._init_derived()
+        return node
+
+    def _init_derived(self) -> None:
+        # A list built only from literals evaluates to itself
+        is_ground = _is_ground(self.head) and _is_ground(self.tail)
+        object.__setattr__(self, "_is_ground", is_ground)
+        if is_ground:
+            # Hash eagerly while the tail's hash is cached, so that long
+            # lists never hash recursively
+            object.__setattr__(self, "_hash", hash((self.head, self.tail)))
 
     def eval(self, env: Environment) -> PureNode:
-        return ConsNode(self.head.eval(env), self.tail.eval(env))
-
-
-@dataclass(frozen=True)
-class NilNode(PureNode):
+        if self._is_ground:
+            return self
+        return ConsNode._unchecked(self.head.eval(env), self.tail.eval(env))
+
+    def __eq__(self, other: object) -> bool:
+        # Walk down the tails in a loop, stopping early at shared sublists
+        a: PureNode = self
+        b: object = other
+        while type(a) is ConsNode:
+            if a is b:
+                return True
+            if type(b) is not ConsNode or a.head != b.head:
+                return False
+            a, b = a.tail, b.tail
+        return a == b
+
+    def __hash__(self) -> int:
+        # Cached, so hashing a list reuses the hashes of its tails
+        try:
+            return self._hash
+        except AttributeError:
+            h = hash((self.head, self.tail))
+            object.__setattr__(self, "_hash", h)
+            return h
+
+    @property
+    def free_vars(self) -> frozenset[str]:
+        return self.head.free_vars | self.tail.free_vars
+
+    def emit(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        if self._is_ground:
+            return gen.const(self)
+        head = self.head.emit(gen, scope)
+        tail = self.tail.emit(gen, scope)
+        result = gen.fresh()
+        gen.line(f"{result} = cons({head}, {tail})")
+        return result
+
+    def fold_constants(self) -> PureNode:
+        head = self.head.fold_constants()
+        tail = self.tail.fold_constants()
+        if head is self.head and tail is self.tail:
+            return self
+        return ConsNode(head, tail)
+
+
+@dataclass(frozen=True, eq=False)
+class NilNode(_Interned, PureNode):
     """
     Represents a 'nil' value.
     Grammar: nil
     """
 
+    __slots__ = ()
+
+    def emit(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        return gen.const(self)
+
+
+_TRUE = TrueNode()
+_FALSE = FalseNode()
+_NIL = NilNode()
+_BOOLS: frozenset[PureNode] = frozenset({_TRUE, _FALSE})
+
+
+def _is_ground(node: PureNode) -> bool:
+    """Check whether a pure node is a value, i.e. evaluates to itself"""
+    if isinstance(node, ConsNode):
+        return node._is_ground
+    return isinstance(node, (TrueNode, FalseNode, NilNode))
+
 
 # --- Expression (e) Classes ---
 
+# Shared by all expressions without symbolic parameters
+_EMPTY_PARAMS: frozenset[str] = frozenset()
+
 
 class UndefinedParamError(Exception):
     """Thrown when a parameter is not defined in the execution environment."""
@@ -272,22 +759,216 @@ class ExpressionNode(ASTNode):
     Abstract base class for expression (e) nodes.
     """
 
+    # Parameter set, static support and compiled sampler, computed on first
+    # use. Slotted nodes have no __dict__, so cached_property can't be used.
+    __slots__ = ("_params", "_static_vals", "_static_dist", "_sampler")
+
+    if TYPE_CHECKING:
+        _params: frozenset[str] = field(init=False)
+        _static_vals: Optional[frozenset[PureNode]] = field(init=False)
+        _static_dist: Optional[Dict[PureNode, float]] = field(init=False)
+        _sampler: Optional[Callable[[Environment, int, Callable], List[PureNode]]] = (
+            field(init=False)
+        )
+
     @abc.abstractmethod
     def sample(self, env: Environment) -> PureNode:
         """Sample a value from the program distribution"""
 
     @abc.abstractmethod
-    def possible_vals(self, env: Environment) -> set[PureNode]:
+    def possible_vals(self, env: Environment) -> AbstractSet[PureNode]:
         """Get possible values for this expression in a given context"""
 
-    @cached_property
-    def params(self) -> set[str]:
+    def infer_batch(self, env: Environment, vals: Iterable[PureNode]) -> List[float]:
+        """Infer the probabilities of several values
+
+        The distribution is computed once and shared by all the values.
+
+        Args:
+            env: naming environment to use
+            vals: values to look up
+
+        Returns:
+            the probability of each value, in order
+        """
+        with env.memoize():
+            dist = self.distribution(env)
+            return [dist.get(val.eval(env), 0.0) for val in vals]
+
+    def distribution(self, env: Environment) -> Dict[PureNode, float]:
+        """Get the distribution over values of this expression
+
+        Args:
+            env: naming environment to use
+
+        Returns:
+            mapping from each possible value to its probability. The returned
+            dict may be shared and must not be mutated.
+        """
+        return {val: self.infer(env, val) for val in self.possible_vals(env)}
+
+    def distribution_and_grad(
+        self, env: Environment
+    ) -> Dict[PureNode, tuple[float, Dict[str, float]]]:
+        """Get the distribution of this expression along with its gradient
+
+        This is the forward-mode counterpart of distribution(): the whole
+        support is scored and differentiated in one traversal, so that many
+        values can be looked up without re-walking the program.
+
+        Args:
+            env: naming environment to use
+
+        Returns:
+            mapping from each possible value to its probability and partial
+            derivatives, as returned by infer_and_grad(). The returned dict
+            may be shared and must not be mutated.
+        """
+        return {val: self.infer_and_grad(env, val) for val in self.possible_vals(env)}
+
+    def sample_batch(self, env: Environment, k: int) -> List[PureNode]:
+        """Draw several independent samples from the program distribution
+
+        Args:
+            env: naming environment to sample in
+            k: number of samples to draw
+
+        Returns:
+            list of k sampled values
+        """
+        samples = []
+        for _ in range(k):
+            with env.temp_scope():
+                samples.append(self.sample(env))
+        return samples
+
+    @property
+    def params(self) -> frozenset[str]:
         """Get symbolic parameters of this expression and its subexpressions"""
-        return set()
+        try:
+            return self._params
+        except AttributeError:
+            params = self._collect_params()
+            object.__setattr__(self, "_params", params)
+            return params
+
+    def _collect_params(self) -> frozenset[str]:
+        """Compute the symbolic parameters of this expression"""
+        return _EMPTY_PARAMS
+
+    @property
+    def possible_vals_static(self) -> Optional[frozenset[PureNode]]:
+        """Possible values of this expression, if they don't depend on bindings
+
+        Returns:
+            the possible values, or None if they depend on the environment
+        """
+        try:
+            return self._static_vals
+        except AttributeError:
+            static_vals = self._collect_static_vals()
+            object.__setattr__(self, "_static_vals", static_vals)
+            return static_vals
+
+    def _collect_static_vals(self) -> Optional[frozenset[PureNode]]:
+        """Compute the binding-independent possible values, if any"""
+        return None
+
+    @property
+    def distribution_static(self) -> Optional[Dict[PureNode, float]]:
+        """Distribution of this expression, if it is the same in every context
+
+        An expression whose possible values don't depend on the bindings and
+        which has no symbolic parameters always has the same distribution.
+
+        Returns:
+            the distribution (which must not be mutated), or None if it
+            depends on the environment
+        """
+        try:
+            return self._static_dist
+        except AttributeError:
+            static_dist = None
+            if self.possible_vals_static is not None and not self.params:
+                static_dist = self.distribution(Environment())
+            object.__setattr__(self, "_static_dist", static_dist)
+            return static_dist
+
+    def fold_constants(self) -> "ExpressionNode":
+        """Simplify conditionals with literal conditions in this program
+
+        Returns:
+            an equivalent program, or this one if nothing could be simplified
+        """
+        return self
+
+    def emit_sample(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        """Generate Python statements drawing one sample from this expression
+
+        Args:
+            gen: code generator for the enclosing sampling kernel
+            scope: mapping of bound variable names to kernel locals
+
+        Returns:
+            source of an expression holding the sampled value
+
+        Raises:
+            SamplerCompileError: if the expression cannot be compiled
+        """
+        raise SamplerCompileError(f"cannot compile {type(self).__name__}")
+
+    def compile_sampler(self) -> Callable[[Environment, int, Callable], List[PureNode]]:
+        """Compile this program into a specialized sampling kernel.
+
+        The kernel takes an environment, a sample count and a uniform random
+        number generator, and draws all samples in a single generated loop,
+        avoiding per-node method dispatch. Kernels are cached per program.
+
+        Raises:
+            SamplerCompileError: if the program contains uncompilable nodes or
+                is too deep to compile
+        """
+        try:
+            sampler = self._sampler
+        except AttributeError:
+            # A failed compile is cached too, so it is not retried per call
+            sampler = self._build_sampler()
+            object.__setattr__(self, "_sampler", sampler)
+        if sampler is None:
+            raise SamplerCompileError(f"cannot compile {type(self).__name__}")
+        return sampler
+
+    def _build_sampler(
+        self,
+    ) -> Optional[Callable[[Environment, int, Callable], List[PureNode]]]:
+        """Generate and compile the sampling kernel, or None if impossible"""
+        gen = _SamplerCodegen()
+        try:
+            result = self.emit_sample(gen, {})
+            return gen.build(result)
+        except (SamplerCompileError, SyntaxError, RecursionError):
+            return None
 
     def gradient(self, env: Environment, val: PureNode) -> ParamVector:
         """Compute the gradient of the denotation for a particular value"""
-        return ParamVector({p: self.deriv(env, p, val) for p in self.params})
+        _, grad = self.infer_and_grad(env, val)
+        return ParamVector({p: grad.get(p, 0.0) for p in self.params})
+
+    def infer_and_grad(
+        self, env: Environment, val: PureNode
+    ) -> tuple[float, Dict[str, float]]:
+        """Compute the denotation and its gradient in a single traversal
+
+        Args:
+            env: naming environment to use
+            val: value at which to evaluate
+
+        Returns:
+            the probability of the value, and its partial derivatives with
+            respect to each parameter (parameters with zero derivative may be
+            omitted). The returned dict must not be mutated.
+        """
+        return self.infer(env, val), {p: self.deriv(env, p, val) for p in self.params}
 
     def deriv(self, env: Environment, param: str, val: PureNode) -> float:
         """Compute the derivative of the denotation for some parameter
@@ -303,12 +984,19 @@ class ExpressionNode(ASTNode):
         return 0.0
 
     def sample_toplevel(
-        self, env: Optional[Environment] = None, k: int = 1
+        self,
+        env: Optional[Environment] = None,
+        k: int = 1,
+        seed: Any = None,
+        workers: int = 1,
     ) -> List[PureNode]:
         """Sample at the top-level with an empty environment
 
         Args:
             k: number of samples to evaluate
+            seed: if given, draw from a freshly seeded generator for this call
+                only, so that the samples are reproducible
+            workers: number of processes to split the samples across
 
         Return:
             Resulting value from sampling
@@ -321,11 +1009,59 @@ class ExpressionNode(ASTNode):
             raise UndefinedParamError(
                 f"""undefined parameters: {",".join(undefined_params)}"""
             )
-        samples = []
-        for _ in range(k):
-            samples.append(self.sample(env))
-            env.clear_bindings()
-        return samples
+        prev_rng = env.rng
+        if seed is not None:
+            env.rng = random.Random(seed)
+        try:
+            if workers > 1 and k > 1:
+                return self._sample_parallel(env, k, workers)
+            return self._sample_serial(env, k)
+        finally:
+            # A seeded generator is only used for this call
+            env.rng = prev_rng
+
+    def _sample_serial(self, env: Environment, k: int) -> List[PureNode]:
+        """Draw k samples in this process"""
+        try:
+            kernel = self.compile_sampler()
+        except SamplerCompileError:
+            return self.sample_batch(env, k)
+        return kernel(env, k, env.rng.random)
+
+    def _sample_parallel(
+        self, env: Environment, k: int, workers: int
+    ) -> List[PureNode]:
+        """Draw k samples split across a pool of worker processes.
+
+        Each worker gets its own generator, seeded from the environment's, and
+        a copy of the parameters and visible bindings.
+        """
+        workers = min(workers, k)
+        sizes = [k // workers + (i < k % workers) for i in range(workers)]
+        seeds = [env.rng.getrandbits(64) for _ in sizes]
+        n = len(sizes)
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            chunks = pool.map(
+                _sample_chunk,
+                [self] * n,
+                [dict(env.params)] * n,
+                [dict(env.bindings)] * n,
+                sizes,
+                seeds,
+            )
+            return [sample for chunk in chunks for sample in chunk]
+
+
+def _sample_chunk(
+    expr: ExpressionNode,
+    params: Dict[str, float],
+    bindings: Dict[str, Any],
+    k: int,
+    seed: int,
+) -> List[PureNode]:
+    """Worker entry point for parallel top-level sampling"""
+    env = Environment(params, bindings, rng=random.Random(seed))
+    return expr._sample_serial(env, k)
 
 
 @dataclass(frozen=True)
@@ -335,8 +1071,14 @@ class ReturnNode(ExpressionNode):
     Grammar: return p
     """
 
+    __slots__ = ("value", "_closed_value")
+
     value: PureNode
 
+    if TYPE_CHECKING:
+        # Value of a closed return, or None if it depends on the bindings
+        _closed_value: Optional[PureNode] = field(init=False)
+
     def __post_init__(self):
         """
         Initializes a ReturnNode.
@@ -344,18 +1086,67 @@ class ReturnNode(ExpressionNode):
         Args:
             value: The pure value to be returned (an instance of PureNode).
         """
-        if not isinstance(self.value, PureNode):
-            raise TypeError("Return value must be an instance of PureNode.")
-
-    def possible_vals(self, env: Environment) -> set[PureNode]:
+        if __debug__:
+            if not isinstance(self.value, PureNode):
+                raise TypeError("Return value must be an instance of PureNode.")
+
+    def possible_vals(self, env: Environment) -> AbstractSet[PureNode]:
+        static_vals = self.possible_vals_static
+        if static_vals is not None:
+            return static_vals
         return {self.value.eval(env)}
 
+    def _collect_static_vals(self) -> Optional[frozenset[PureNode]]:
+        if self.value.free_vars:
+            return None
+        return frozenset((self._eval_value(Environment()),))
+
+    def fold_constants(self) -> ExpressionNode:
+        value = self.value.fold_constants()
+        if value is self.value:
+            return self
+        return ReturnNode(value)
+
+    def _eval_value(self, env: Environment) -> PureNode:
+        # A value without free variables always evaluates to the same result,
+        # so it is only evaluated once
+        try:
+            closed_value = self._closed_value
+        except AttributeError:
+            closed_value = None
+            if not self.value.free_vars:
+                closed_value = self.value.eval(Environment())
+            object.__setattr__(self, "_closed_value", closed_value)
+        if closed_value is None:
+            return self.value.eval(env)
+        return closed_value
+
     def sample(self, env: Environment) -> PureNode:
-        return self.value.eval(env)
+        return self._eval_value(env)
+
+    def sample_batch(self, env: Environment, k: int) -> List[PureNode]:
+        # Pure values are immutable, so all samples can share one evaluation
+        return [self._eval_value(env)] * k
+
+    def emit_sample(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        return self.value.emit(gen, scope)
 
     def infer(self, env: Environment, val: PureNode) -> float:
         return self.value.infer(env, val)
 
+    def distribution(self, env: Environment) -> Dict[PureNode, float]:
+        return {self._eval_value(env): 1.0}
+
+    def infer_and_grad(
+        self, env: Environment, val: PureNode
+    ) -> tuple[float, Dict[str, float]]:
+        return self.infer(env, val), {}
+
+    def distribution_and_grad(
+        self, env: Environment
+    ) -> Dict[PureNode, tuple[float, Dict[str, float]]]:
+        return {self._eval_value(env): (1.0, {})}
+
 
 @dataclass(frozen=True)
 class FlipNode(ExpressionNode):
@@ -364,8 +1155,14 @@ class FlipNode(ExpressionNode):
     Grammar: flip theta
     """
 
+    __slots__ = ("theta", "_param")
+
     theta: float | str
 
+    if TYPE_CHECKING:
+        # Name of the symbolic parameter, or None for a fixed probability
+        _param: Optional[str] = field(init=False)
+
     def __post_init__(self):
         """
         Initializes a FlipNode.
@@ -373,47 +1170,98 @@ class FlipNode(ExpressionNode):
         Args:
             theta: The probability value (a float between 0.0 and 1.0).
         """
-        if isinstance(self.theta, float) and not (0.0 <= self.theta <= 1.0):
-            raise ValueError("Theta must be between 0.0 and 1.0 (inclusive).")
+        if __debug__:
+            if isinstance(self.theta, float) and not (0.0 <= self.theta <= 1.0):
+                raise ValueError("Theta must be between 0.0 and 1.0 (inclusive).")
+        param = None
+        if isinstance(self.theta, str):
+            param = sys.intern(self.theta)
+            object.__setattr__(self, "theta", param)
+        object.__setattr__(self, "_param", param)
 
     def get_theta(self, env: Environment) -> float:
         """Get the value of the parameter."""
-        if isinstance(self.theta, str):
-            return env.get_param(self.theta)
-        return self.theta
+        theta = self.theta
+        if isinstance(theta, str):
+            return env.get_param(theta)
+        return theta
 
     def sample(self, env: Environment) -> PureNode:
-        return boolean(random.random() < self.get_theta(env))
+        return boolean(env.rng.random() < self.get_theta(env))
 
-    def possible_vals(self, env: Environment) -> set[PureNode]:
-        return {TrueNode(), FalseNode()}
+    def sample_batch(self, env: Environment, k: int) -> List[PureNode]:
+        theta = self.get_theta(env)
+        rand = env.rng.random
+        return [boolean(rand() < theta) for _ in range(k)]
+
+    def emit_sample(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        if self._param is not None:
+            theta = gen.param(self._param)
+        else:
+            theta = repr(self.theta)
+        result = gen.fresh()
+        gen.line(
+            f"{result} = {gen.const(_TRUE)} if rand() < {theta} else {gen.const(_FALSE)}"
+        )
+        return result
+
+    def possible_vals(self, env: Environment) -> AbstractSet[PureNode]:
+        return _BOOLS
+
+    def _collect_static_vals(self) -> Optional[frozenset[PureNode]]:
+        return _BOOLS
 
     def infer(self, env: Environment, val: PureNode) -> float:
+        # Booleans are interned, so identity checks suffice
         val = val.eval(env)
-        if isinstance(val, TrueNode):
+        if val is _TRUE:
             return self.get_theta(env)
-        if isinstance(val, FalseNode):
+        if val is _FALSE:
             return 1 - self.get_theta(env)
         return 0.0
 
+    def distribution(self, env: Environment) -> Dict[PureNode, float]:
+        theta = self.get_theta(env)
+        return {_TRUE: theta, _FALSE: 1 - theta}
+
+    def distribution_and_grad(
+        self, env: Environment
+    ) -> Dict[PureNode, tuple[float, Dict[str, float]]]:
+        theta = self.get_theta(env)
+        param = self._param
+        if param is None:
+            return {_TRUE: (theta, {}), _FALSE: (1 - theta, {})}
+        return {
+            _TRUE: (theta, {param: 1.0}),
+            _FALSE: (1 - theta, {param: -1.0}),
+        }
+
     def deriv(self, env: Environment, param: str, val: PureNode) -> float:
-        if isinstance(self.theta, float) or self.theta != param:
+        if self._param != param:
             return 0.0
 
         val = val.eval(env)
-        if isinstance(val, TrueNode):
+        if val is _TRUE:
             grad = 1.0
-        elif isinstance(val, FalseNode):
+        elif val is _FALSE:
             grad = -1.0
         else:
             grad = 0.0
         return grad
 
-    @cached_property
-    def params(self) -> set[str]:
-        if isinstance(self.theta, str):
-            return {self.theta}
-        return set()
+    def infer_and_grad(
+        self, env: Environment, val: PureNode
+    ) -> tuple[float, Dict[str, float]]:
+        prob = self.infer(env, val)
+        param = self._param
+        if param is None:
+            return prob, {}
+        return prob, {param: self.deriv(env, param, val)}
+
+    def _collect_params(self) -> frozenset[str]:
+        if self._param is not None:
+            return frozenset((self._param,))
+        return _EMPTY_PARAMS
 
 
 @dataclass(frozen=True)
@@ -423,6 +1271,8 @@ class SequenceNode(ExpressionNode):
     Grammar: x <- e; e
     """
 
+    __slots__ = ("variable_name", "assignment_expr", "next_expr")
+
     variable_name: str
     assignment_expr: ExpressionNode
     next_expr: ExpressionNode
@@ -436,38 +1286,95 @@ class SequenceNode(ExpressionNode):
             assignment_expr: The expression 'e' whose result is assigned to 'x' (an instance of ExpressionNode).
             next_expr: The subsequent expression 'e' to execute (an instance of ExpressionNode).
         """
-        if not isinstance(self.variable_name, str) or not self.variable_name:
-            raise ValueError("Variable name must be a non-empty string.")
-        if not isinstance(self.assignment_expr, ExpressionNode):
-            raise TypeError(
-                "Assignment expression must be an instance of ExpressionNode."
-            )
-        if not isinstance(self.next_expr, ExpressionNode):
-            raise TypeError("Next expression must be an instance of ExpressionNode.")
+        if __debug__:
+            if not isinstance(self.variable_name, str) or not self.variable_name:
+                raise ValueError("Variable name must be a non-empty string.")
+            if not isinstance(self.assignment_expr, ExpressionNode):
+                raise TypeError(
+                    "Assignment expression must be an instance of ExpressionNode."
+                )
+            if not isinstance(self.next_expr, ExpressionNode):
+                raise TypeError(
+                    "Next expression must be an instance of ExpressionNode."
+                )
+        object.__setattr__(self, "variable_name", sys.intern(self.variable_name))
 
     def sample(self, env: Environment) -> PureNode:
-        bind_val = self.assignment_expr.sample(env)
-        env.add_binding(self.variable_name, bind_val)
-        return self.next_expr.sample(env)
+        # Programs are long right-nested chains of binds, so walk the chain
+        # in a loop rather than recursing into next_expr.
+        node: ExpressionNode = self
+        while type(node) is SequenceNode:
+            bind_val = node.assignment_expr.sample(env)
+            env.add_binding(node.variable_name, bind_val)
+            node = node.next_expr
+        return node.sample(env)
+
+    def sample_batch(self, env: Environment, k: int) -> List[PureNode]:
+        # Group the samples by the value bound to the variable, so that the
+        # continuation is sampled once per distinct value rather than once per
+        # sample. The results are written back in their original positions.
+        groups: Dict[PureNode, List[int]] = {}
+        for i, bind_val in enumerate(self.assignment_expr.sample_batch(env, k)):
+            groups.setdefault(bind_val, []).append(i)
+        samples: List[PureNode] = [None] * k  # type: ignore[list-item]
+        for bind_val, idxs in groups.items():
+            with env.temp_binding(self.variable_name, bind_val):
+                next_vals = self.next_expr.sample_batch(env, len(idxs))
+            for i, next_val in zip(idxs, next_vals):
+                samples[i] = next_val
+        return samples
 
-    def possible_vals(self, env: Environment) -> set[PureNode]:
-        poss = set()
+    def emit_sample(self, gen: _SamplerCodegen, scope: Dict[str, str]) -> str:
+        node: ExpressionNode = self
+        while type(node) is SequenceNode:
+            bind_val = gen.fresh()
+            gen.line(f"{bind_val} = {node.assignment_expr.emit_sample(gen, scope)}")
+            scope = {**scope, node.variable_name: bind_val}
+            node = node.next_expr
+        return node.emit_sample(gen, scope)
+
+    def possible_vals(self, env: Environment) -> AbstractSet[PureNode]:
+        static_vals = self.possible_vals_static
+        if static_vals is not None:
+            return static_vals
+        return self._possible_vals_dynamic(env)
+
+    @_memoize_infer
+    def _possible_vals_dynamic(self, env: Environment) -> frozenset[PureNode]:
+        poss: set[PureNode] = set()
         for val in self.assignment_expr.possible_vals(env):
             with env.temp_binding(self.variable_name, val):
                 poss |= self.next_expr.possible_vals(env)
-        return poss
+        return frozenset(poss)
 
     def infer(self, env: Environment, val: PureNode) -> float:
+        return self.distribution(env).get(val.eval(env), 0.0)
+
+    @_memoize_infer
+    def distribution(self, env: Environment) -> Dict[PureNode, float]:
         # The denotation of a sequence is the sum of the products of the
         # probabilities of each possible intermediate value resulting in the
         # given value being produced:
         # sum_{v in val} [[assign]](env, v) * [[next]](env[x |-> v], val)
-        prob = 0.0
-        for poss_val in self.assignment_expr.possible_vals(env):
-            with env.temp_binding(self.variable_name, poss_val):
-                bound_val_prob = self.assignment_expr.infer(env, poss_val)
-                prob += bound_val_prob * self.next_expr.infer(env, val)
-        return prob
+        # Both distributions are enumerated once, so the whole distribution
+        # is computed in a single pass. The assignment is evaluated in the
+        # outer environment, where the variable is not yet bound.
+        assign_dist = self.assignment_expr.distribution_static
+        if assign_dist is None:
+            assign_dist = self.assignment_expr.distribution(env)
+        static_next_dist = self.next_expr.distribution_static
+        dist: Dict[PureNode, float] = {}
+        for bind_val, bind_prob in assign_dist.items():
+            if bind_prob == 0.0:
+                continue
+            if static_next_dist is not None:
+                next_dist = static_next_dist
+            else:
+                with env.temp_binding(self.variable_name, bind_val):
+                    next_dist = self.next_expr.distribution(env)
+            for val, prob in next_dist.items():
+                dist[val] = dist.get(val, 0.0) + bind_prob * prob
+        return dist
 
     def deriv(self, env: Environment, param: str, val: PureNode) -> float:
         # The derivative of a sequence is computed with the product rule using
@@ -484,6 +1391,66 @@ class SequenceNode(ExpressionNode):
             deriv += del_e1 * e2 + e1 * del_e2  # Product rule
         return deriv
 
-    @cached_property
-    def params(self) -> set[str]:
+    @_memoize_infer
+    def infer_and_grad(
+        self, env: Environment, val: PureNode
+    ) -> tuple[float, Dict[str, float]]:
+        # Forward-mode differentiation of the sum in infer(): the probability
+        # and the derivatives for every parameter are accumulated together,
+        # applying the product rule as in deriv().
+        prob = 0.0
+        grad: Dict[str, float] = {}
+        for poss_val in self.assignment_expr.possible_vals(env):
+            e1, del_e1 = self.assignment_expr.infer_and_grad(env, poss_val)
+            if e1 == 0.0 and not any(del_e1.values()):
+                continue
+            with env.temp_binding(self.variable_name, poss_val):
+                e2, del_e2 = self.next_expr.infer_and_grad(env, val)
+            prob += e1 * e2
+            for param, d in del_e1.items():
+                grad[param] = grad.get(param, 0.0) + d * e2
+            for param, d in del_e2.items():
+                grad[param] = grad.get(param, 0.0) + e1 * d
+        return prob, grad
+
+    @_memoize_infer
+    def distribution_and_grad(
+        self, env: Environment
+    ) -> Dict[PureNode, tuple[float, Dict[str, float]]]:
+        # Forward-mode differentiation of distribution(), applying the
+        # product rule as in infer_and_grad() to every value at once
+        assign_dist = self.assignment_expr.distribution_and_grad(env)
+        dist: Dict[PureNode, tuple[float, Dict[str, float]]] = {}
+        for bind_val, (e1, del_e1) in assign_dist.items():
+            if e1 == 0.0 and not any(del_e1.values()):
+                continue
+            with env.temp_binding(self.variable_name, bind_val):
+                next_dist = self.next_expr.distribution_and_grad(env)
+            for val, (e2, del_e2) in next_dist.items():
+                prob, grad = dist[val] if val in dist else (0.0, {})
+                for param, d in del_e1.items():
+                    grad[param] = grad.get(param, 0.0) + d * e2
+                for param, d in del_e2.items():
+                    grad[param] = grad.get(param, 0.0) + e1 * d
+                dist[val] = (prob + e1 * e2, grad)
+        return dist
+
+    def _collect_params(self) -> frozenset[str]:
         return self.assignment_expr.params | self.next_expr.params
+
+    def _collect_static_vals(self) -> Optional[frozenset[PureNode]]:
+        # If the continuation's values don't depend on the bound variable,
+        # they are the values of the whole sequence (provided the assignment
+        # can produce anything at all).
+        assign_vals = self.assignment_expr.possible_vals_static
+        next_vals = self.next_expr.possible_vals_static
+        if assign_vals is None or next_vals is None:
+            return None
+        return next_vals if assign_vals else frozenset()
+
+    def fold_constants(self) -> ExpressionNode:
+        assignment_expr = self.assignment_expr.fold_constants()
+        next_expr = self.next_expr.fold_constants()
+        if assignment_expr is self.assignment_expr and next_expr is self.next_expr:
+            return self
+        return SequenceNode(self.variable_name, assignment_expr, next_expr)
@@ -1,4 +1,5 @@
 import math
+from collections import Counter
 
 from pyppl import ast
 from pyppl.params import ParamVector
@@ -9,7 +10,12 @@ def avg_negative_log_likelihood(
 ) -> float:
     """Compute the negative log-likelihood of a collection of data."""
     env = ast.Environment(params)
-    return -sum(math.log(prog.infer(env, d)) for d in data) / len(data)
+    # Score each distinct datum once, weighted by its multiplicity
+    counts = Counter(data)
+    probs = prog.infer_batch(env, counts)
+    return -math.fsum(n * math.log(p) for n, p in zip(counts.values(), probs)) / len(
+        data
+    )
 
 
 def avg_negative_log_likelihood_gradient(
@@ -26,15 +32,54 @@ def avg_negative_log_likelihood_gradient(
         negative log-likelihood of observing the training set given the program
         and the parameters
     """
+    if not data:
+        raise ValueError("empty training set")
     env = ast.Environment(params)
-    grad = sum(prog.gradient(env, val) / prog.infer(env, val) for val in data) / len(
-        data
-    )
-    if isinstance(grad, (float, int)):
-        raise ValueError("empty training set or type error")
+    with env.memoize():
+        grad = ParamVector.sum(
+            prog.gradient(env, val) / prog.infer(env, val) for val in data
+        )
+    grad /= len(data)
     return grad
 
 
+def nll_and_gradient(
+    prog: ast.ExpressionNode,
+    params: ParamVector,
+    data: list[ast.PureNode] | Counter[ast.PureNode],
+) -> tuple[float, ParamVector]:
+    """Compute the negative log-likelihood and its gradient in a single pass.
+
+    Args:
+        prog: an expression representing the generating program
+        params: mapping of parameter names to values
+        data: the training set, or a Counter of its distinct data and their
+            multiplicities
+
+    Returns:
+        the values of avg_negative_log_likelihood and
+        avg_negative_log_likelihood_gradient
+    """
+    if not data:
+        raise ValueError("empty training set")
+    # Score each distinct datum once, weighted by its multiplicity
+    counts = data if isinstance(data, Counter) else Counter(data)
+    env = ast.Environment(params)
+    log_probs = []
+    grad = ParamVector.zero(prog.params)
+    no_grad: dict[str, float] = {}
+    with env.memoize():
+        # Score and differentiate the program's whole support once, then
+        # look up each datum
+        dist = prog.distribution_and_grad(env)
+        for d, n in counts.items():
+            prob, prob_grad = dist.get(d.eval(env), (0.0, no_grad))
+            log_probs.append(n * math.log(prob))
+            grad.scatter_add(prob_grad, n / prob)
+    n_data = counts.total()
+    return -math.fsum(log_probs) / n_data, grad / n_data
+
+
 def optimize(
     prog: ast.ExpressionNode,
     data: list[ast.PureNode],
@@ -42,11 +87,14 @@ def optimize(
     learning_rate: float = 0.01,
 ) -> ParamVector:
     """Optimize parameters to maximize the likelihood of the training set"""
+    if not data:
+        raise ValueError("empty training set")
+    # The training set is fixed, so it is only grouped once
+    counts = Counter(data)
     params = ParamVector.random(prog.params)
     for epoch in range(epochs):
-        nll = avg_negative_log_likelihood(prog, params, data)
+        nll, grad = nll_and_gradient(prog, params, counts)
         print(f"epoch: {epoch}; nll: {nll}")
-        grad = avg_negative_log_likelihood_gradient(prog, params, data)
-        params += learning_rate * grad
+        params.axpy(learning_rate, grad)
 
     return params
@@ -1,5 +1,6 @@
+import math
 import random
-from typing import Any, Collection
+from typing import Any, Collection, Iterable, Mapping
 
 
 class ParamVector(dict):
@@ -19,6 +20,20 @@ class ParamVector(dict):
             # Convert all initial values to float
             super().__setitem__(k, float(v))
 
+    @classmethod
+    def _from_floats(cls, items: dict[str, float]) -> "ParamVector":
+        """Wrap a mapping whose values are already floats, skipping conversion.
+
+        Args:
+            items: mapping of parameter names to float values
+
+        Returns:
+            parameter vector with the given entries
+        """
+        vec = cls.__new__(cls)
+        dict.update(vec, items)
+        return vec
+
     @classmethod
     def zero(cls, params: Collection[str]) -> "ParamVector":
         """Initialize a zero vector with the given parameter names.
@@ -44,13 +59,57 @@ class ParamVector(dict):
         """
         return cls((k, random.random()) for k in params)
 
+    @classmethod
+    def sum(cls, vectors: Iterable["ParamVector"]) -> "ParamVector":
+        """Add up several vectors with the same keys.
+
+        Unlike the builtin sum(), only the result is allocated: the first
+        vector is copied and the rest are added to it in place.
+
+        Args:
+            vectors: non-empty iterable of vectors to add
+
+        Returns:
+            a new vector holding the sum
+
+        Raises:
+            ValueError: If there are no vectors or their keys do not match.
+        """
+        it = iter(vectors)
+        try:
+            total = cls._from_floats(next(it))
+        except StopIteration:
+            raise ValueError("cannot sum an empty collection of vectors") from None
+        for vec in it:
+            total += vec
+        return total
+
     def squared_l2_norm(self) -> float:
         """Get the squared L2 norm of this vector
 
         Returns:
             float: The squared L2 norm of the vector.
         """
-        return sum(self[k] * self[k] for k in self.keys())
+        values = self.values()
+        return math.sumprod(values, values)
+
+    def squared_l2_distance(self, other: "ParamVector") -> float:
+        """Get the squared L2 norm of (self - other)
+
+        Computed in one pass, without building the difference vector.
+
+        Args:
+            other (ParamVector): The vector to measure the distance to.
+
+        Returns:
+            float: The squared L2 distance between the vectors.
+
+        Raises:
+            ValueError: If keys in vectors do not match.
+        """
+        self._check_keys_match(other)
+        diffs = [v - other[k] for k, v in self.items()]
+        return math.sumprod(diffs, diffs)
 
     def _check_keys_match(self, other: "ParamVector") -> None:
         """Check that the keys match between this vector and the other vector.
@@ -61,9 +120,9 @@ class ParamVector(dict):
         Raises:
             ValueError: If keys do not match.
         """
-        this_keys = set(self.keys())
-        other_keys = set(other.keys())
-        if this_keys != other_keys:
+        if self.keys() != other.keys():
+            this_keys = set(self.keys())
+            other_keys = set(other.keys())
             raise ValueError(
                 f"keys in vectors do not match (this: {this_keys}, other: {other_keys})"
             )
@@ -81,7 +140,7 @@ class ParamVector(dict):
             ValueError: If keys in vectors do not match.
         """
         self._check_keys_match(other)
-        return ParamVector((k, self[k] + other[k]) for k in self.keys())
+        return ParamVector._from_floats({k: v + other[k] for k, v in self.items()})
 
     def __radd__(self, other: Any) -> "ParamVector":
         """Handles reverse addition (e.g., 0 + ParamVector).
@@ -97,8 +156,9 @@ class ParamVector(dict):
         """
         if isinstance(other, (int, float)):
             if other == 0:
-                # If adding 0 from the left, return a new ParamVector with the same content
-                return ParamVector(self)
+                # If adding 0 from the left, return a copy; the values are
+                # already floats, so they need no conversion
+                return ParamVector._from_floats(self)
             else:
                 # If 'other' is a non-zero int/float, and it's on the left,
                 # this operation does not make sense for a ParamVector.
@@ -120,9 +180,54 @@ class ParamVector(dict):
             ParamVector: The modified current instance (self).
         """
         self._check_keys_match(other)
-        for k in self.keys():
-            # Use regular addition for the values, and __setitem__ will handle float conversion
-            self[k] = self[k] + other[k]
+        dict.update(self, {k: v + other[k] for k, v in self.items()})
+        return self
+
+    def axpy(self, alpha: int | float, other: "ParamVector") -> "ParamVector":
+        """Add a scaled vector to this one in place (self += alpha * other).
+
+        Unlike the equivalent operator expression, no intermediate vector is
+        allocated for the scaled operand.
+
+        Args:
+            alpha (int | float): The scale factor for the other vector.
+            other (ParamVector): The vector to scale and add.
+
+        Returns:
+            ParamVector: The modified current instance (self).
+
+        Raises:
+            ValueError: If keys in vectors do not match.
+        """
+        self._check_keys_match(other)
+        alpha = float(alpha)
+        dict.update(self, {k: v + alpha * other[k] for k, v in self.items()})
+        return self
+
+    def scatter_add(
+        self, updates: Mapping[str, float], alpha: int | float = 1.0
+    ) -> "ParamVector":
+        """Add scaled values to some of the entries of this vector in place.
+
+        Equivalent to ``self[k] += alpha * v`` for each entry of updates, but
+        the keys are validated once for the whole batch.
+
+        Args:
+            updates (Mapping[str, float]): Values to add, keyed by parameter.
+                Keys missing from updates are left unchanged.
+            alpha (int | float): The scale factor for the updates.
+
+        Returns:
+            ParamVector: The modified current instance (self).
+
+        Raises:
+            ValueError: If updates has keys that are not in this vector.
+        """
+        if not updates.keys() <= self.keys():
+            extra_keys = set(updates.keys()) - set(self.keys())
+            raise ValueError(f"no such keys {extra_keys} in vector")
+        alpha = float(alpha)
+        dict.update(self, {k: self[k] + alpha * v for k, v in updates.items()})
         return self
 
     def __sub__(self, other: "ParamVector") -> "ParamVector":
@@ -138,7 +243,7 @@ class ParamVector(dict):
             ValueError: If keys in vectors do not match.
         """
         self._check_keys_match(other)
-        return ParamVector((k, self[k] - other[k]) for k in self.keys())
+        return ParamVector._from_floats({k: v - other[k] for k, v in self.items()})
 
     def __isub__(self, other: "ParamVector") -> "ParamVector":
         """Performs in-place subtraction (-=) of two ParamVector instances.
@@ -152,8 +257,7 @@ class ParamVector(dict):
             ParamVector: The modified current instance (self).
         """
         self._check_keys_match(other)
-        for k in self.keys():
-            self[k] = self[k] - other[k]
+        dict.update(self, {k: v - other[k] for k, v in self.items()})
         return self
 
     def __mul__(self, x: int | float) -> "ParamVector":
@@ -165,7 +269,8 @@ class ParamVector(dict):
         Returns:
             ParamVector: A new ParamVector instance with scaled values.
         """
-        return ParamVector((k, self[k] * x) for k in self.keys())
+        x = float(x)
+        return ParamVector._from_floats({k: v * x for k, v in self.items()})
 
     def __rmul__(self, x: int | float) -> "ParamVector":
         """Handles reverse multiplication (e.g., scalar * ParamVector).
@@ -189,8 +294,8 @@ class ParamVector(dict):
         Returns:
             ParamVector: The modified current instance (self).
         """
-        for k in self.keys():
-            self[k] = self[k] * x
+        x = float(x)
+        dict.update(self, {k: v * x for k, v in self.items()})
         return self
 
     def __truediv__(self, x: int | float) -> "ParamVector":
@@ -208,7 +313,7 @@ class ParamVector(dict):
         if x == 0:
             raise ZeroDivisionError("division by zero")
         one_over_x = 1 / x
-        return ParamVector((k, self[k] * one_over_x) for k in self.keys())
+        return ParamVector._from_floats({k: v * one_over_x for k, v in self.items()})
 
     def __itruediv__(self, x: int | float) -> "ParamVector":
         """Performs in-place division (/=) by a scalar x.
@@ -226,8 +331,8 @@ class ParamVector(dict):
         """
         if x == 0:
             raise ZeroDivisionError("division by zero")
-        for k in self.keys():
-            self[k] = self[k] / x
+        one_over_x = 1 / x
+        dict.update(self, {k: v * one_over_x for k, v in self.items()})
         return self
 
     def __neg__(self) -> "ParamVector":
@@ -236,7 +341,7 @@ class ParamVector(dict):
         Returns:
             ParamVector: A new ParamVector instance with negated values.
         """
-        return ParamVector((k, -self[k]) for k in self.keys())
+        return ParamVector._from_floats({k: -v for k, v in self.items()})
 
     def __setitem__(self, key: Any, value: Any) -> None:
         """Sets the value for an existing key.
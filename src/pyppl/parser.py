@@ -1,25 +1,61 @@
+import functools
+import os
+import stat
+from typing import Optional
+
 from lark import Lark, Transformer, v_args
 
 from pyppl import ast
 
+
+def _parser_cache_path() -> Optional[str]:
+    """Get the file to cache the parser tables in, if it is safe to use one
+
+    The tables are unpickled when loaded, so they are only cached in a
+    per-user directory that is owned by the current user and private to
+    them; a shared location would let other users inject code.
+
+    Returns:
+        path of the cache file, or None if no private cache directory is
+        available
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    cache_dir = os.path.join(base, "pyppl")
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        st = os.stat(cache_dir)
+    except OSError:
+        return None
+    getuid = getattr(os, "getuid", None)
+    if getuid is not None and (
+        st.st_uid != getuid() or st.st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+    ):
+        return None
+    return os.path.join(cache_dir, "parser.lark_cache")
+
+
+_cache_path = _parser_cache_path()
+
 pyppl_parser = Lark(
     r"""
-    value             : eff_expr
-    eff_expr          : VAR_OR_PARAM_NAME "<-" non_bind_eff_expr ";" eff_expr -> bind_expr
-                      | non_bind_eff_expr
-    non_bind_eff_expr : "flip" param -> flip_expr
-                      | "return" pure_expr -> return_expr
-                      | "(" eff_expr ")"
-    param             : FLOAT -> float_param
-                      | VAR_OR_PARAM_NAME -> sym_param
-    pure_expr         : "if" pure_expr "then" pure_expr "else" non_if_pure_expr -> if_then_else
-                      | non_if_pure_expr
-    non_if_pure_expr  : "true" -> true
-                      | "false" -> false
-                      | "cons" pure_expr pure_expr -> cons
-                      | "nil" -> nil
-                      | "(" pure_expr ")"
-                      | VAR_OR_PARAM_NAME -> var
+    value              : eff_expr
+    ?eff_expr          : VAR_OR_PARAM_NAME "<-" non_bind_eff_expr ";" eff_expr -> bind_expr
+                       | non_bind_eff_expr
+    ?non_bind_eff_expr : "flip" param -> flip_expr
+                       | "return" pure_expr -> return_expr
+                       | "(" eff_expr ")"
+    param              : FLOAT -> float_param
+                       | VAR_OR_PARAM_NAME -> sym_param
+    ?pure_expr         : "if" pure_expr "then" pure_expr "else" non_if_pure_expr -> if_then_else
+                       | non_if_pure_expr
+    ?non_if_pure_expr  : "true" -> true
+                       | "false" -> false
+                       | "cons" pure_expr pure_expr -> cons
+                       | "nil" -> nil
+                       | "(" pure_expr ")"
+                       | VAR_OR_PARAM_NAME -> var
     # The negative lookahead `(?!...)` ensures that the regex will not match
     # if the current position is at the start of any of the listed keywords.
     VAR_OR_PARAM_NAME : /(?!if\b|then\b|else\b|true\b|false\b|cons\b|nil\b|flip\b|return\b)[a-zA-Z_][a-zA-Z0-9_]*/
@@ -31,6 +67,8 @@ pyppl_parser = Lark(
     """,
     start="value",
     parser="lalr",
+    # Store the built parser tables on disk so later imports can load them
+    cache=_cache_path if _cache_path is not None else False,
 )
 
 
@@ -185,80 +223,20 @@ class PypplTransformer(Transformer):
         """
         return ast.VariableNode(str(name))
 
-    # Terminal rules
-    def VAR_OR_PARAM_NAME(self, token):
-        """Handles the VAR_OR_PARAM_NAME terminal.
-
-        Args:
-            token: The token representing the variable or parameter name.
-
-        Returns:
-            The string value of the token.
-        """
-        return str(token)
-
-    def FLOAT(self, token):
-        """Handles the FLOAT terminal.
-
-        Args:
-            token: The token representing the float value.
-
-        Returns:
-            The float value of the token.
-        """
-        return float(token)
-
-    # Default for rules that just pass through their child (e.g., non_bind_eff_expr, pure_expr)
-    # Lark automatically handles these if no specific method is defined,
-    # but defining them can make the transformer more explicit.
-    def eff_expr(self, child):
-        """Passes through the transformed child for rules that don't create new AST nodes.
-
-        Args:
-            child: The transformed child node.
-
-        Returns:
-            The transformed child node.
-        """
-        return child
 
-    def non_bind_eff_expr(self, child):
-        """Passes through the transformed child for rules that don't create new AST nodes.
-
-        Args:
-            child: The transformed child node.
-
-        Returns:
-            The transformed child node.
-        """
-        return child
-
-    def pure_expr(self, child):
-        """Passes through the transformed child for rules that don't create new AST nodes.
-
-        Args:
-            child: The transformed child node.
-
-        Returns:
-            The transformed child node.
-        """
-        return child
-
-    def non_if_pure_expr(self, child):
-        """Passes through the transformed child for rules that don't create new AST nodes.
-
-        Args:
-            child: The transformed child node.
-
-        Returns:
-            The transformed child node.
-        """
-        return child
+# The transformer keeps no state between calls, so a single instance is shared.
+# No terminals have handlers (rules convert their tokens themselves), so
+# tokens need not be visited.
+_transformer = PypplTransformer(visit_tokens=False)
 
 
+@functools.lru_cache(maxsize=128)
 def parse(input: str) -> ast.ExpressionNode:
     """Parse a program into an abstract syntax tree.
 
+    Results are cached by source text. Syntax trees are immutable, so the
+    same tree can safely be returned for repeated parses.
+
     Args:
         input: string containing program text
 
@@ -269,4 +247,4 @@ def parse(input: str) -> ast.ExpressionNode:
         lark.UnexpectedInput: on syntax error
     """
     tree = pyppl_parser.parse(input)
-    return PypplTransformer().transform(tree)
+    return _transformer.transform(tree).fold_constants()
@@ -1,3 +1,7 @@
+import pickle
+import random
+import sys
+
 import pytest
 
 from pyppl.ast import (
@@ -10,8 +14,10 @@ from pyppl.ast import (
     NilNode,
     PureNode,
     ReturnNode,
+    SamplerCompileError,
     SequenceNode,
     TrueNode,
+    UndefinedParamError,
     VariableNode,
     var,
 )
@@ -194,6 +200,208 @@ def test_complex_scope_management_and_bindings():
     assert env.get_binding("var1") == node1
 
 
+def test_initial_vals_bound_until_scope_removed():
+    """Test initial values are visible, shadowable, and dropped with their scope."""
+    node = MockPureNode(1)
+    env = Environment(initial_vals={"x": node})
+    assert env.get_binding("x") is node
+    with env.temp_binding("x", MockPureNode(2)):
+        assert env.get_binding("x") == MockPureNode(2)
+    assert env.get_binding("x") is node
+    env.remove_scope()
+    with pytest.raises(ValueError, match="name x not bound"):
+        env.get_binding("x")
+
+
+def test_fingerprint_tracks_binding_state():
+    """Test that equal binding states get equal fingerprints."""
+    env = Environment()
+    base = env.fingerprint
+    val = MockPureNode(1)
+    with env.temp_binding("x", val):
+        bound = env.fingerprint
+        assert bound != base
+        with env.temp_binding("x", MockPureNode(2)):
+            assert env.fingerprint != bound
+            with env.temp_binding("x", val):
+                # Shadowing restores the visible binding
+                assert env.fingerprint == bound
+    assert env.fingerprint == base
+    with env.temp_binding("x", val):
+        assert env.fingerprint == bound
+    with env.temp_binding("x", MockPureNode(1)):
+        assert env.fingerprint != bound
+    env.clear_bindings()
+    assert env.fingerprint == base
+
+
+def test_fingerprint_tags_are_pruned():
+    """Test that a long-lived environment drops tags of unbound values."""
+    env = Environment()
+    outer = MockPureNode(0)
+    with env.temp_binding("x", outer):
+        bound = env.fingerprint
+        for i in range(1000):
+            with env.temp_binding("y", MockPureNode(i)):
+                pass
+            assert env.fingerprint == bound
+        assert len(env._tags) < 200
+        with env.temp_binding("x", MockPureNode(-1)):
+            pass
+        assert env.fingerprint == bound
+    env.clear_bindings()
+    assert not env._tags
+
+
+def test_removing_initial_scope_resets_fingerprint():
+    """Test that memoized results don't survive removing the initial bindings."""
+    env = Environment(initial_vals={"x": TrueNode()})
+    expr = SequenceNode("y", FlipNode(0.5), ReturnNode(var("x")))
+    with env.memoize():
+        assert expr.infer(env, TrueNode()) == 1.0
+        env.remove_scope()
+        env.add_scope()
+        assert env.fingerprint == 0
+        with pytest.raises(ValueError):
+            expr.infer(env, TrueNode())
+
+
+def test_memoized_infer_matches_uncached():
+    """Test that memoizing inference across queries does not change results."""
+    env = Environment({"p": 0.3, "q": 0.6})
+    expr = SequenceNode(
+        "x",
+        FlipNode("p"),
+        SequenceNode(
+            "y", FlipNode("q"), ReturnNode(IfElseNode(var("x"), var("y"), FalseNode()))
+        ),
+    )
+    expected = [expr.infer(env, v) for v in (TrueNode(), FalseNode())]
+    with env.memoize():
+        assert [expr.infer(env, v) for v in (TrueNode(), FalseNode())] == expected
+        assert env.infer_cache
+    assert env.infer_cache is None
+
+
+def test_memoized_infer_errors_are_not_chained():
+    """Test that errors raised during memoized inference keep no cache-miss context."""
+    expr = SequenceNode(
+        "x",
+        ReturnNode(ConsNode(TrueNode(), NilNode())),
+        SequenceNode(
+            "y", FlipNode(0.5), ReturnNode(IfElseNode(var("x"), var("y"), FalseNode()))
+        ),
+    )
+    env = Environment()
+    with env.memoize(), pytest.raises(ValueError) as excinfo:
+        expr.infer(env, TrueNode())
+    assert excinfo.value.__context__ is None
+
+
+def test_infer_and_grad_matches_infer_and_deriv():
+    """Test that the fused pass agrees with separate infer/deriv calls."""
+    env = Environment({"p": 0.3, "q": 0.6})
+    expr = SequenceNode(
+        "x",
+        FlipNode("p"),
+        SequenceNode(
+            "y", FlipNode("q"), ReturnNode(IfElseNode(var("x"), var("y"), var("x")))
+        ),
+    )
+    for v in (TrueNode(), FalseNode()):
+        prob, grad = expr.infer_and_grad(env, v)
+        assert prob == pytest.approx(expr.infer(env, v))
+        for p in ("p", "q"):
+            assert grad.get(p, 0.0) == pytest.approx(expr.deriv(env, p, v))
+
+
+def test_distribution_and_grad_matches_infer_and_grad():
+    """Test that the whole-support pass agrees with per-value inference."""
+    env = Environment({"p": 0.3, "q": 0.6})
+    expr = SequenceNode(
+        "x",
+        FlipNode("p"),
+        SequenceNode(
+            "y", FlipNode("q"), ReturnNode(IfElseNode(var("x"), var("y"), var("x")))
+        ),
+    )
+    dist = expr.distribution_and_grad(env)
+    assert dist.keys() == {TrueNode(), FalseNode()}
+    for v, (prob, grad) in dist.items():
+        expected_prob, expected_grad = expr.infer_and_grad(env, v)
+        assert prob == pytest.approx(expected_prob)
+        for p in ("p", "q"):
+            assert grad.get(p, 0.0) == pytest.approx(expected_grad.get(p, 0.0))
+
+
+def test_seq_infer_assignment_sees_outer_binding():
+    """Test that a rebinding's assignment is inferred in the outer scope."""
+    env = Environment({"p": 0.3})
+    expr = SequenceNode(
+        "x",
+        FlipNode("p"),
+        SequenceNode(
+            "x", ReturnNode(ConsNode(var("x"), NilNode())), ReturnNode(var("x"))
+        ),
+    )
+    val = ConsNode(TrueNode(), NilNode())
+    assert expr.infer(env, val) == pytest.approx(0.3)
+    assert expr.deriv(env, "p", val) == pytest.approx(1.0)
+    assert expr.infer_and_grad(env, val)[0] == pytest.approx(0.3)
+
+
+def test_distribution():
+    """Test that distributions agree with per-value inference."""
+    env = Environment({"p": 0.3, "q": 0.6})
+    expr = SequenceNode(
+        "x",
+        FlipNode("p"),
+        SequenceNode(
+            "y",
+            FlipNode("q"),
+            ReturnNode(IfElseNode(var("x"), ConsNode(var("y"), NilNode()), NilNode())),
+        ),
+    )
+    dist = expr.distribution(env)
+    assert dist == pytest.approx(
+        {
+            ConsNode(TrueNode(), NilNode()): 0.18,
+            ConsNode(FalseNode(), NilNode()): 0.12,
+            NilNode(): 0.7,
+        }
+    )
+    for val in expr.possible_vals(env):
+        assert expr.infer(env, val) == pytest.approx(dist[val])
+
+
+def test_distribution_static():
+    """Test that context-independent distributions are computed once."""
+    flip = FlipNode(0.3)
+    assert flip.distribution_static == {TrueNode(): 0.3, FalseNode(): 0.7}
+    assert flip.distribution_static is flip.distribution_static
+    assert FlipNode("p").distribution_static is None
+    assert ReturnNode(var("x")).distribution_static is None
+    expr = SequenceNode("x", flip, ReturnNode(var("x")))
+    env = Environment()
+    env.add_binding("x", NilNode())
+    assert expr.distribution(env) == pytest.approx({TrueNode(): 0.3, FalseNode(): 0.7})
+
+
+def test_infer_batch():
+    """Test that batched inference matches per-value inference."""
+    env = Environment({"p": 0.3})
+    expr = SequenceNode("x", FlipNode("p"), ReturnNode(ConsNode(var("x"), NilNode())))
+    vals = [
+        ConsNode(TrueNode(), NilNode()),
+        NilNode(),
+        ConsNode(FalseNode(), NilNode()),
+    ]
+    assert expr.infer_batch(env, vals) == pytest.approx([0.3, 0.0, 0.7])
+    assert expr.infer_batch(env, vals) == pytest.approx(
+        [expr.infer(env, v) for v in vals]
+    )
+
+
 def test_purenode_eval():
     """Test PureNode.eval returns self."""
     node = MockPureNode("hello")
@@ -227,6 +435,45 @@ def test_falsenode_bool():
     assert bool(FalseNode()) is False
 
 
+def test_names_are_interned():
+    """Test that variable and parameter names share interned strings."""
+    name = "".join(["th", "eta"])
+    assert FlipNode(name).theta is sys.intern("theta")
+    assert var(name).name is sys.intern("theta")
+    assert SequenceNode(name, FlipNode(0.5), ReturnNode(NilNode())).variable_name is (
+        sys.intern("theta")
+    )
+
+
+def test_literal_nodes_are_interned():
+    """Test fieldless literal nodes share a single instance, even across pickling."""
+    assert TrueNode() is TrueNode()
+    assert FalseNode() is FalseNode()
+    assert NilNode() is NilNode()
+    assert TrueNode() is not FalseNode()
+    assert pickle.loads(pickle.dumps(NilNode())) is NilNode()
+
+
+@pytest.mark.parametrize("protocol", range(pickle.HIGHEST_PROTOCOL + 1))
+def test_literal_nodes_pickle_roundtrip(protocol):
+    """Test literal nodes and lists of them survive pickling with every protocol."""
+    for node in (TrueNode(), FalseNode(), NilNode()):
+        assert pickle.loads(pickle.dumps(node, protocol)) is node
+    lst = ConsNode(TrueNode(), ConsNode(FalseNode(), NilNode()))
+    assert pickle.loads(pickle.dumps(lst, protocol)) == lst
+
+
+def test_nodes_are_slotted_and_picklable():
+    """Test AST nodes carry no instance dict and survive a pickle round trip."""
+    expr = SequenceNode(
+        "x", FlipNode("theta"), ReturnNode(ConsNode(var("x"), NilNode()))
+    )
+    assert not hasattr(expr, "__dict__")
+    restored = pickle.loads(pickle.dumps(expr))
+    assert restored == expr
+    assert restored.params == {"theta"}
+
+
 def test_purenodes_not_converted_to_bool():
     """Test that PureNodes are not converted to bools by default"""
     with pytest.raises(ValueError):
@@ -272,6 +519,38 @@ def test_ifelsenode_eval_false_condition():
     assert if_else_node.eval(env) is false_branch_result
 
 
+def test_consnode_eval_ground_list_is_reused():
+    """Test that evaluating a list of literals returns the list itself."""
+    lst = ConsNode(TrueNode(), ConsNode(FalseNode(), NilNode()))
+    assert lst.eval(Environment()) is lst
+    env = Environment()
+    env.add_binding("x", TrueNode())
+    open_lst = ConsNode(var("x"), lst)
+    result = open_lst.eval(env)
+    assert result == ConsNode(TrueNode(), lst)
+    assert result.tail is lst
+
+
+def test_consnode_long_list_eq_and_hash():
+    """Test equality and hashing of lists longer than the recursion limit."""
+
+    def make_list(n):
+        lst = NilNode()
+        for i in range(n):
+            lst = ConsNode(TrueNode() if i % 2 else FalseNode(), lst)
+        return lst
+
+    n = 2 * sys.getrecursionlimit()
+    a, b = make_list(n), make_list(n)
+    assert a == b
+    assert hash(a) == hash(b)
+    assert a != ConsNode(TrueNode(), b)
+    assert a != TrueNode()
+    assert hash(ConsNode(TrueNode(), NilNode())) == hash(
+        ConsNode(TrueNode(), NilNode())
+    )
+
+
 def test_consonde_eval():
     """Test ConsNode.eval evaluates head and tail and returns a new ConsNode."""
     env = Environment()
@@ -373,6 +652,127 @@ def test_sequencenode_sample(mocker):
     assert env.get_binding(var_name) is assigned_value
 
 
+def test_flipnode_sample_batch(mocker):
+    """Test FlipNode.sample_batch draws one value per requested sample."""
+    env = Environment()
+    mocker.patch("random.random", side_effect=[0.1, 0.9, 0.4])
+    assert FlipNode(0.5).sample_batch(env, 3) == [TrueNode(), FalseNode(), TrueNode()]
+
+
+def test_seq_sample_batch_preserves_order(mocker):
+    """Test SequenceNode.sample_batch keeps each sample in its original position."""
+    env = Environment()
+    mocker.patch("random.random", side_effect=[0.9, 0.1, 0.9, 0.1])
+    expr = SequenceNode("x", FlipNode(0.5), ReturnNode(ConsNode(var("x"), NilNode())))
+    samples = expr.sample_batch(env, 4)
+    assert samples == [
+        ConsNode(FalseNode(), NilNode()),
+        ConsNode(TrueNode(), NilNode()),
+        ConsNode(FalseNode(), NilNode()),
+        ConsNode(TrueNode(), NilNode()),
+    ]
+    # Bindings made while sampling do not leak into the environment
+    with pytest.raises(ValueError):
+        env.get_binding("x")
+
+
+def test_sample_toplevel_undefined_param():
+    """Test sample_toplevel rejects programs with unbound parameters."""
+    with pytest.raises(UndefinedParamError):
+        FlipNode("theta").sample_toplevel(k=2)
+
+
+def test_sample_toplevel_compiled(mocker):
+    """Test the compiled sampler draws flips in program order."""
+    env = Environment({"theta": 0.5})
+    mocker.patch("random.random", side_effect=[0.9, 0.1, 0.1, 0.1])
+    expr = SequenceNode(
+        "x",
+        FlipNode("theta"),
+        SequenceNode(
+            "y",
+            FlipNode(0.5),
+            ReturnNode(IfElseNode(var("x"), ConsNode(var("y"), NilNode()), NilNode())),
+        ),
+    )
+    assert expr.sample_toplevel(env, k=2) == [
+        NilNode(),
+        ConsNode(TrueNode(), NilNode()),
+    ]
+
+
+def test_seq_sample_deep_chain():
+    """Test that sampling a long chain of binds does not recurse per bind."""
+    depth = 5 * sys.getrecursionlimit()
+    expr = ReturnNode(var("x0"))
+    for i in reversed(range(depth)):
+        expr = SequenceNode(f"x{i}", FlipNode(1.0), expr)
+    assert expr.sample(Environment()) is TrueNode()
+    kernel = expr.compile_sampler()
+    assert kernel(Environment(), 1, random.random) == [TrueNode()]
+
+
+def test_sample_toplevel_seed_is_reproducible():
+    """Test that seeded sampling draws from the environment's generator."""
+    expr = SequenceNode("x", FlipNode(0.5), ReturnNode(ConsNode(var("x"), NilNode())))
+    first = expr.sample_toplevel(k=50, seed=1234)
+    assert expr.sample_toplevel(k=50, seed=1234) == first
+    env = Environment(rng=random.Random(1234))
+    assert expr.sample_batch(env, 50) == first
+    # The caller's generator is left in place
+    rng = random.Random(0)
+    env = Environment(rng=rng)
+    expr.sample_toplevel(env, k=5, seed=1234)
+    assert env.rng is rng
+
+
+def test_sample_toplevel_parallel():
+    """Test that samples can be split across worker processes."""
+    expr = SequenceNode("x", FlipNode("p"), ReturnNode(ConsNode(var("x"), NilNode())))
+    env = Environment({"p": 0.5})
+    samples = expr.sample_toplevel(env, k=9, seed=7, workers=2)
+    assert len(samples) == 9
+    assert set(samples) <= {
+        ConsNode(TrueNode(), NilNode()),
+        ConsNode(FalseNode(), NilNode()),
+    }
+    assert expr.sample_toplevel(env, k=9, seed=7, workers=2) == samples
+
+
+def test_sample_toplevel_falls_back_to_interpreter():
+    """Test programs with uncompilable nodes are still sampled."""
+    expr = ReturnNode(MockPureNode("hello"))
+    with pytest.raises(SamplerCompileError):
+        expr.compile_sampler()
+    assert expr.sample_toplevel(k=2) == [MockPureNode("hello")] * 2
+
+
+def test_sample_toplevel_deep_list():
+    """Test that deeply nested values compile without nesting the generated code."""
+    value: PureNode = NilNode()
+    for _ in range(300):
+        value = ConsNode(var("x"), value)
+    expr = SequenceNode("x", FlipNode(1.0), ReturnNode(value))
+    expected = NilNode()
+    for _ in range(300):
+        expected = ConsNode(TrueNode(), expected)
+    expr.compile_sampler()
+    assert expr.sample_toplevel(k=2) == [expected] * 2
+
+
+def test_sample_toplevel_falls_back_when_too_deep():
+    """Test that programs beyond the compiler's limits are sampled by the interpreter."""
+    value: PureNode = var("x")
+    for _ in range(150):
+        value = IfElseNode(var("x"), value, FalseNode())
+    expr = SequenceNode("x", FlipNode(1.0), ReturnNode(value))
+    with pytest.raises(SamplerCompileError):
+        expr.compile_sampler()
+    # The failure is cached rather than compiled again on every call
+    assert expr._sampler is None
+    assert expr.sample_toplevel(k=2) == [TrueNode()] * 2
+
+
 def test_seq_possible_vals_return():
     """Test sequencing possible values with a return"""
     env = Environment()
@@ -381,6 +781,38 @@ def test_seq_possible_vals_return():
     assert expr.possible_vals(env) == {TrueNode(), FalseNode()}
 
 
+def test_return_closed_value_evaluated_once():
+    """Test that a return of a closed value reuses one evaluation."""
+    expr = ReturnNode(
+        IfElseNode(
+            TrueNode(),
+            ConsNode(IfElseNode(FalseNode(), NilNode(), TrueNode()), NilNode()),
+            NilNode(),
+        )
+    )
+    env = Environment()
+    first = expr.sample(env)
+    assert first == ConsNode(TrueNode(), NilNode())
+    assert expr.sample(env) is first
+    assert expr.sample_batch(env, 3) == [first] * 3
+
+
+def test_possible_vals_static():
+    """Test binding-independent possible values are computed statically."""
+    assert FlipNode(0.5).possible_vals_static == {TrueNode(), FalseNode()}
+    assert ReturnNode(ConsNode(TrueNode(), NilNode())).possible_vals_static == {
+        ConsNode(TrueNode(), NilNode())
+    }
+    assert ReturnNode(var("x")).possible_vals_static is None
+    assert (
+        SequenceNode("x", FlipNode(0.5), ReturnNode(var("x"))).possible_vals_static
+        is None
+    )
+    assert SequenceNode(
+        "x", FlipNode(0.5), ReturnNode(NilNode())
+    ).possible_vals_static == {NilNode()}
+
+
 def test_seq_return_inference():
     """Test sequencing a flip and a return"""
     env = Environment()
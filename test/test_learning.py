@@ -0,0 +1,75 @@
+import math
+
+import pytest
+
+from pyppl.ast import (
+    ConsNode,
+    FalseNode,
+    FlipNode,
+    NilNode,
+    ReturnNode,
+    SequenceNode,
+    TrueNode,
+    var,
+)
+from pyppl.learning import (
+    avg_negative_log_likelihood,
+    avg_negative_log_likelihood_gradient,
+    nll_and_gradient,
+    optimize,
+)
+from pyppl.params import ParamVector
+
+
+def test_nll_and_gradient_matches_separate_passes():
+    """Test that the fused pass agrees with the separate NLL and gradient."""
+    prog = SequenceNode(
+        "x",
+        FlipNode("p"),
+        SequenceNode("y", FlipNode("q"), ReturnNode(ConsNode(var("x"), var("y")))),
+    )
+    params = ParamVector({"p": 0.3, "q": 0.8})
+    data = [
+        ConsNode(TrueNode(), FalseNode()),
+        ConsNode(FalseNode(), TrueNode()),
+        ConsNode(FalseNode(), TrueNode()),
+    ]
+    # P(tt, ff) = p * (1 - q) and P(ff, tt) = (1 - p) * q, so each datum
+    # contributes n/p or -n/(1 - p), and -n/(1 - q) or n/q, to the gradient
+    expected_nll = -(math.log(0.3 * 0.2) + 2 * math.log(0.7 * 0.8)) / 3
+    expected_grad = {
+        "p": (1 / 0.3 - 2 / 0.7) / 3,
+        "q": (-1 / 0.2 + 2 / 0.8) / 3,
+    }
+    nll, grad = nll_and_gradient(prog, params, data)
+    assert nll == pytest.approx(expected_nll)
+    assert avg_negative_log_likelihood(prog, params, data) == pytest.approx(
+        expected_nll
+    )
+    for g in (grad, avg_negative_log_likelihood_gradient(prog, params, data)):
+        assert g.keys() == expected_grad.keys()
+        for k in g:
+            assert g[k] == pytest.approx(expected_grad[k])
+
+
+def test_impossible_data_are_rejected():
+    """Test that data the program cannot produce are not scored."""
+    prog = SequenceNode("x", FlipNode("p"), ReturnNode(ConsNode(var("x"), NilNode())))
+    params = ParamVector({"p": 0.3})
+    data = [ConsNode(TrueNode(), NilNode()), NilNode()]
+    with pytest.raises(ValueError):
+        nll_and_gradient(prog, params, data)
+    with pytest.raises(ValueError):
+        avg_negative_log_likelihood(prog, params, data)
+
+
+def test_nll_and_gradient_empty_data():
+    """Test that an empty training set is rejected."""
+    with pytest.raises(ValueError):
+        nll_and_gradient(ReturnNode(NilNode()), ParamVector(), [])
+
+
+def test_optimize_empty_data():
+    """Test that optimize rejects an empty training set up front."""
+    with pytest.raises(ValueError):
+        optimize(ReturnNode(NilNode()), [], epochs=1)
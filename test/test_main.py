@@ -1,8 +1,10 @@
+import pickle
 from unittest import mock
 
 import pytest
 
-from pyppl.__main__ import PickleDumper, PickleLoader
+from pyppl.__main__ import PickleDumper, PickleLoader, init_params
+from pyppl.ast import FlipNode, SequenceNode
 
 
 # Unit tests for PickleLoader and PickleDumper
@@ -59,7 +61,9 @@ class TestPickleDumper:
         # 1. Check if open was called with the correct path and 'wb' mode
         mock_open.assert_called_once_with(file_path, mode="wb")
         # 2. Check if pickle.Pickler was instantiated with the file handle
-        mock_pickler_class.assert_called_once_with(mock_open())
+        mock_pickler_class.assert_called_once_with(
+            mock_open(), protocol=pickle.HIGHEST_PROTOCOL
+        )
         # 3. Check if the dump method of the pickler instance was called with the data
         mock_pickler_instance.dump.assert_called_once_with(data_to_dump)
         # 4. Check if the file was closed
@@ -103,3 +107,11 @@ class TestPickleDumper:
         # Ensure open was called and the file was closed, despite the error
         mock_open.assert_called_once_with(file_path, mode="wb")
         mock_open().close.assert_called_once()
+
+
+def test_init_params():
+    """Tests that init_params assigns a value in [0, 1] to every parameter."""
+    expr = SequenceNode("x", FlipNode("a"), FlipNode("b"))
+    params = init_params(expr)
+    assert set(params) == {"a", "b"}
+    assert all(0.0 <= v <= 1.0 for v in params.values())
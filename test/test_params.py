@@ -187,6 +187,19 @@ def test_iadd_mismatched_keys():
         v1 += v2
 
 
+def test_axpy():
+    """
+    Tests in-place scaled addition of two ParamVector instances.
+    """
+    v1 = ParamVector({"a": 1.0, "b": 2.0})
+    v2 = ParamVector({"a": 3.0, "b": 4.0})
+    result = v1.axpy(-0.5, v2)
+    assert result is v1
+    assert v1 == {"a": -0.5, "b": 0.0}
+    with pytest.raises(ValueError, match="keys in vectors do not match"):
+        v1.axpy(1, ParamVector({"c": 1.0}))
+
+
 def test_isub_success():
     """
     Tests in-place subtraction (-=) of two ParamVector instances.
@@ -275,6 +288,61 @@ def test_sum_of_param_vectors_with_zero_start():
     assert result == {"a": 4.0, "b": 6.0}
 
 
+def test_squared_l2_distance():
+    """
+    Tests the squared_l2_distance method.
+    """
+    v1 = ParamVector({"a": 3.0, "b": 4.0})
+    v2 = ParamVector({"a": 0.0, "b": 0.0})
+    assert v1.squared_l2_distance(v2) == 25.0
+    assert v1.squared_l2_distance(v1) == 0.0
+    with pytest.raises(ValueError):
+        v1.squared_l2_distance(ParamVector({"a": 0.0}))
+
+
+def test_radd_zero_returns_copy():
+    """
+    Tests that adding a ParamVector to 0 returns an independent copy.
+    """
+    v = ParamVector({"a": 1.0, "b": 2.0})
+    result = 0 + v
+    assert isinstance(result, ParamVector)
+    assert result == v
+    assert result is not v
+    result["a"] = 5.0
+    assert v["a"] == 1.0
+
+
+def test_scatter_add():
+    """
+    Tests adding scaled values to a subset of the entries in place.
+    """
+    v = ParamVector({"a": 1.0, "b": 2.0, "c": 3.0})
+    result = v.scatter_add({"a": 1.0, "c": -2.0}, 0.5)
+    assert result is v
+    assert v == {"a": 1.5, "b": 2.0, "c": 2.0}
+    with pytest.raises(ValueError):
+        v.scatter_add({"d": 1.0})
+    assert v == {"a": 1.5, "b": 2.0, "c": 2.0}
+
+
+def test_classmethod_sum():
+    """
+    Tests ParamVector.sum, which allocates only the result.
+    """
+    v1 = ParamVector({"a": 1.0, "b": 2.0})
+    v2 = ParamVector({"a": 3.0, "b": 4.0})
+    result = ParamVector.sum([v1, v2])
+    assert isinstance(result, ParamVector)
+    assert result == {"a": 4.0, "b": 6.0}
+    assert v1 == {"a": 1.0, "b": 2.0}
+    assert ParamVector.sum([v1]) is not v1
+    with pytest.raises(ValueError):
+        ParamVector.sum([])
+    with pytest.raises(ValueError):
+        ParamVector.sum([v1, ParamVector({"a": 1.0})])
+
+
 def test_sum_empty_list_with_paramvector_start():
     """
     Tests summing an empty list with a ParamVector start value.
@@ -1,7 +1,9 @@
+import os
+
 import pytest
 
 from pyppl import ast as _ast
-from pyppl.parser import PypplTransformer, pyppl_parser
+from pyppl.parser import PypplTransformer, _parser_cache_path, parse, pyppl_parser
 
 
 @pytest.fixture
@@ -65,6 +67,22 @@ def test_if_then_else(parser, transformer):
     assert isinstance(if_node.false_branch, _ast.NilNode)
 
 
+def test_parse_caches_by_source():
+    """Tests that parsing the same source twice returns the same tree."""
+    assert parse("x <- flip p; return x") is parse("x <- flip p; return x")
+
+
+def test_parse_folds_constant_conditions():
+    """Tests that parse() drops conditionals on literal booleans."""
+    ast = parse(
+        "x <- flip 0.5; return cons (if true then x else nil) (if false then x else nil)"
+    )
+    assert isinstance(ast, _ast.SequenceNode)
+    assert ast.next_expr.value == _ast.ConsNode(_ast.VariableNode("x"), _ast.NilNode())
+    unfolded = parse("x <- flip 0.5; return if x then true else false")
+    assert isinstance(unfolded.next_expr.value, _ast.IfElseNode)
+
+
 def test_cons_node(parser, transformer):
     """Tests the transformation of a 'cons' expression."""
     code = "return cons true false"
@@ -187,3 +205,14 @@ def test_variable_name_keywords(parser, transformer):
         parser.parse("return then")
     with pytest.raises(Exception):
         parser.parse("return else")
+
+
+def test_parser_cache_path_is_private(tmp_path, monkeypatch):
+    """Tests that the parser tables are only cached in a private directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = _parser_cache_path()
+    assert path is not None
+    assert os.path.dirname(path) == str(tmp_path / "pyppl")
+    assert os.stat(tmp_path / "pyppl").st_mode & 0o777 == 0o700
+    os.chmod(tmp_path / "pyppl", 0o777)
+    assert _parser_cache_path() is None